@@ -1,12 +1,39 @@
 """Command-line interface for 404 Finder."""
 
+from __future__ import annotations
+
 import argparse
 import importlib.metadata
 import json
 import sys
+from types import ModuleType
 from urllib.parse import urlparse
 
-from .crawler import crawl_site, is_same_domain, setup_logging
+from .crawler import crawl_site, get_domain, is_same_domain, setup_logging
+
+orjson: ModuleType | None
+try:
+    import orjson  # type: ignore[import-not-found, no-redef, unused-ignore]
+except ImportError:
+    orjson = None
+
+
+def _dumps(result):
+    """Serialize one JSONL record to bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(result)
+    # Match orjson's compact, UTF-8 output so records look the same either way
+    return json.dumps(result, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _open_results_stream(output_file):
+    """Open a binary stream with a 1 MiB buffer for JSONL results.
+
+    Writes to stdout when output_file is None.
+    """
+    if output_file is None:
+        return open(sys.stdout.fileno(), "wb", buffering=1 << 20, closefd=False)
+    return open(output_file, "wb", buffering=1 << 20)
 
 
 def main() -> int:
@@ -42,7 +69,7 @@ def main() -> int:
     parser.add_argument(
         "--version", action="version", version=f"find_404 {importlib.metadata.version('find_404')}",
     )
-    parser.add_argument("URL", help="The URL to start crawling from")
+    parser.add_argument("url", metavar="URL", help="The URL to start crawling from")
     parser.add_argument(
         "--max-size",
         type=int,
@@ -52,6 +79,12 @@ def main() -> int:
     parser.add_argument(
         "--workers", type=int, help="Number of parallel workers", default=10,
     )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        help="Number of processes to parse HTML in (default: 0, parse in the worker threads)",
+        default=0,
+    )
     parser.add_argument(
         "--max-depth",
         type=int,
@@ -69,73 +102,83 @@ def main() -> int:
         output_destination = "file"
         output_file = args.output
 
-    # Setup logging with the new options
-    logger = setup_logging(
-        verbose=args.verbose,
-        format_type=args.format,
-        output_destination=output_destination,
-        output_file=output_file
-    )
+    if args.format == "jsonl":
+        # JSONL results skip logging and go straight to one large buffer, so
+        # the logger only carries diagnostics and can stay on stdout/stderr
+        results_stream = _open_results_stream(output_file)
+        logger = setup_logging(verbose=args.verbose, format_type=args.format)
+    else:
+        results_stream = None
+        # Setup logging with the new options
+        logger = setup_logging(
+            verbose=args.verbose,
+            format_type=args.format,
+            output_destination=output_destination,
+            output_file=output_file
+        )
 
     # Get domain name for potential default file naming (fallback)
     if not args.url.startswith(("http://", "https://")):
         args.url = "http://" + args.url
     domain = urlparse(args.url).netloc
 
-    report = crawl_site(args.url, max_workers=args.workers, max_depth=args.max_depth)
+    results = crawl_site(
+        args.url,
+        max_workers=args.workers,
+        max_depth=args.max_depth,
+        max_size=args.max_size,
+        parse_workers=args.parse_workers,
+    )
 
-    has_errors = False
-    size_exceeded = False
     final_errors = []
-    
-    # Sort URLs by size before output
-    sorted_items = sorted(report.items(), key=lambda x: x[1]["size"])
-    
-    # Output results based on format
-    if args.format == "jsonl":
-        for url, info in sorted_items:
+    base_domain = get_domain(args.url)
+
+    # JSONL results are streamed as each URL completes; the console report
+    # is sorted by size, so it has to wait for the whole crawl
+    if args.format != "jsonl":
+        results = sorted(results, key=lambda x: x[1]["size"])
+        logger.info(f"Crawl Results for {args.url}")
+        logger.info("=" * 50)
+
+    # Output results and collect errors and size violations in a single pass
+    for url, info in results:
+        status = info["status_code"]
+        size = info["size"]
+        referrer = info.get("referrer")
+
+        if args.format == "jsonl":
             result = {
                 "url": url,
-                "status_code": info["status_code"],
-                "size": info["size"],
-                "referrer": info.get("referrer"),
+                "status_code": status,
+                "size": size,
+                "referrer": referrer,
             }
-            logger.info(json.dumps(result))
-    else:  # console format
-        logger.info(f"Crawl Results for {args.url}")
-        logger.info("=" * 50)
-        for url, info in sorted_items:
-            status = info["status_code"]
-            size = info["size"]
-            referrer = info.get("referrer", "N/A")
+            results_stream.write(_dumps(result) + b"\n")
+        else:  # console format
             logger.info(f"URL: {url}")
             logger.info(f"  Status: {status}")
             logger.info(f"  Size: {size} bytes")
             logger.info(f"  Referrer: {referrer}")
             logger.info("")
 
-    # Check for errors and size violations
-    for url, info in sorted_items:
-        if isinstance(info["status_code"], int) and 400 <= info["status_code"] < 600:
+        # Status codes are always int or a marker string, never a bool
+        if type(status) is int and 400 <= status < 600:
+            final_errors.append(f"Error: {url} returned status code {status}")
+        if args.max_size and size > args.max_size and is_same_domain(url, base_domain):
+            # Bodies are only read up to just past max_size, so that size is a lower bound
+            size_note = f"at least {size}" if info.get("truncated") else f"actual size: {size}"
             final_errors.append(
-                f"Error: {url} returned status code {info['status_code']}",
+                f"Error: {url} exceeds maximum size of {args.max_size} bytes ({size_note} bytes)",
             )
-            has_errors = True
-        if (
-            args.max_size
-            and info["size"] > args.max_size
-            and is_same_domain(url, args.url)
-        ):
-            final_errors.append(
-                f"Error: {url} exceeds maximum size of {args.max_size} bytes (actual size: {info['size']} bytes)",
-            )
-            size_exceeded = True
+
+    if results_stream is not None:
+        results_stream.close()
 
     # Print all collected errors at the end
     for error in final_errors:
         logger.error(error)
 
-    if has_errors or size_exceeded:
+    if final_errors:
         return 1
     return 0
 
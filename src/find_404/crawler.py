@@ -1,12 +1,68 @@
 """Core crawler functionality for finding broken links."""
 
+from __future__ import annotations
+
+import io
 import logging
+import multiprocessing
+import queue
+import re
+import socket
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from urllib.parse import urljoin, urlparse
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache, partial
+from typing import NamedTuple
+from urllib.parse import urljoin
 
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from requests.adapters import DEFAULT_POOLSIZE, HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Looked up once; setup_logging configures this same logger in place
+_logger = logging.getLogger("crawler")
+
+# Links we never fetch: JavaScript pseudo-URLs, in-page anchors, inline data,
+# phone, SMS and e-mail links
+_BAD_PREFIX_RE = re.compile(
+    r"^(?:javascript:|void\(|#|data:|tel:|sms:|mailto:)", re.IGNORECASE,
+)
+
+# Character set declared in a Content-Type header
+_CHARSET_RE = re.compile(r"""charset=["']?([\w.:-]+)""", re.IGNORECASE)
+
+# Only <a href> tags matter, so BeautifulSoup can skip building the rest of the tree
+_LINK_TAGS = SoupStrainer("a", href=True)
+
+# Schemes the crawler fetches; start URLs without one default to http://
+_HTTP_PREFIXES = ("http://", "https://")
+
+# Status codes servers commonly answer HEAD with when they just don't support it
+_HEAD_REJECTED = (403, 405, 501)
+
+# The DNS cache wraps socket.getaddrinfo for as long as any crawl is running,
+# but only threads that opted in through _dns_local use it
+_dns_lock = threading.Lock()
+_dns_users = 0
+_dns_wrapped = False
+_system_getaddrinfo = socket.getaddrinfo
+_dns_local = threading.local()
+
+# Scheme, netloc, path and query of a URL (RFC 3986 appendix B, minus the fragment)
+_URL_RE = re.compile(r"^(?:([A-Za-z][A-Za-z0-9+.-]*):)?(?://([^/?#]*))?([^?#]*)(?:\?([^#]*))?")
+
+
+class WorkItem(NamedTuple):
+    """A URL waiting to be checked, as queued by crawl_site."""
+
+    url: str
+    should_recurse: bool
+    referrer: str | None
+    depth: int
 
 
 def setup_logging(verbose=False, format_type="console", output_destination="stdout", output_file=None):
@@ -58,55 +114,292 @@ def setup_logging(verbose=False, format_type="console", output_destination="stdo
     return logger
 
 
-def get_domain(url):
+@lru_cache(maxsize=16384)
+def _split_url(url: str) -> tuple[str, str, str, str]:
+    """Split a URL into (scheme, netloc, path, query).
+
+    One regex match is much cheaper than urlparse, which builds a six-field
+    result and handles cases a crawler never needs. Memoized since nav bars
+    and footers repeat the same URLs on every page.
+    """
+    match = _URL_RE.match(url)
+    assert match is not None  # Every part of the pattern is optional, so any string matches
+    scheme, netloc, path, query = match.groups()
+    return (scheme or "").lower(), netloc or "", path, query or ""
+
+
+@lru_cache(maxsize=32768)
+def get_domain(url: str) -> tuple[str, str]:
     """Extracts the (scheme, netloc) part of a URL to identify its domain."""
-    parsed = urlparse(url)
-    return parsed.scheme, parsed.netloc
+    scheme, netloc, _, _ = _split_url(url)
+    return scheme, netloc
 
 
-def normalize_url(url):
+def normalize_url(url: str) -> str:
     """Normalize URL by removing fragment identifier."""
-    parsed = urlparse(url)
-    return urljoin(url, parsed.path + ("?" + parsed.query if parsed.query else ""))
+    return url.partition("#")[0]
+
 
+@lru_cache(maxsize=256)
+def _site_suffix(base_netloc: str) -> tuple[str, str]:
+    """Return the site a base netloc belongs to, and the suffix its subdomains end with.
 
-def is_same_domain(url, base_domain):
+    A leading 'www.' is dropped, e.g. 'www.example.com' -> ('example.com', '.example.com')
+    """
+    site = base_netloc[4:] if base_netloc.startswith("www.") else base_netloc
+    return site, "." + site
+
+
+def is_same_domain(url: str, base_domain: tuple[str, str]) -> bool:
     """Checks whether 'url' is in the same domain or a subdomain of 'base_domain'."""
     scheme, netloc = get_domain(url)
     base_scheme, base_netloc = base_domain
-
-    # Extract the main domain from both URLs by taking the last two parts
-    # e.g., 'sub.example.com' -> 'example.com'
-    main_domain = ".".join(netloc.split(".")[-2:])
-    base_main_domain = ".".join(base_netloc.split(".")[-2:])
+    site, site_suffix = _site_suffix(base_netloc)
 
     # Don't consider scheme change if it's just http vs https
     schemes_match = (scheme == base_scheme) or (
         scheme in ("http", "https") and base_scheme in ("http", "https")
     )
 
-    return schemes_match and main_domain == base_main_domain
+    return schemes_match and (netloc == site or netloc.endswith(site_suffix))
 
 
-def is_valid_url(url):
+def is_valid_url(url: str) -> bool:
     """Check if the URL is valid and not a JavaScript pseudo-URL."""
-    if url.startswith(("javascript:", "void(", "#", "tel:", "mailto:")):
+    if _BAD_PREFIX_RE.match(url):
         return False
+    scheme, netloc, _, _ = _split_url(url)
+    return bool(scheme and netloc)
+
+
+def _thread_getaddrinfo(*args, **kwargs):
+    """socket.getaddrinfo, through the DNS cache of the crawl this thread works for."""
+    lookup = getattr(_dns_local, "lookup", None)
+    if lookup is None:
+        return _system_getaddrinfo(*args, **kwargs)
+    return lookup(*args, **kwargs)
+
+
+@contextmanager
+def _dns_cache(ttl=300, negative_ttl=30, maxsize=4096):
+    """Cache DNS lookups of a crawl's worker threads while the block runs.
+
+    urllib3 resolves the host again for every new connection, and each
+    lookup blocks its worker; sites linking to many CDN and third-party
+    hosts would otherwise repeat the same lookups over and over. Failed
+    lookups are remembered for a shorter while, so every link to a dead
+    host (and every retry) doesn't wait on the resolver again. At most
+    maxsize lookups are kept, dropping the least recently used.
+
+    Each crawl gets its own cache, and only threads that call the yielded
+    function use it, so lookups from the rest of the process are untouched.
+    """
+    global _dns_users, _dns_wrapped, _system_getaddrinfo
+    # key -> (expiry, addresses, error args); only one of the last two is set
+    cache = OrderedDict()
+    cache_lock = threading.Lock()
+
+    def remember(key, entry):
+        with cache_lock:
+            cache[key] = entry
+            cache.move_to_end(key)
+            if len(cache) > maxsize:
+                cache.popitem(last=False)
+
+    def cached_getaddrinfo(*args, **kwargs):
+        key = (args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with cache_lock:
+            entry = cache.get(key)
+            if entry is not None and entry[0] > now:
+                cache.move_to_end(key)
+            else:
+                entry = None
+        if entry is not None:
+            if entry[2] is not None:
+                # Only the arguments are kept, not the exception with its traceback
+                raise socket.gaierror(*entry[2])
+            return entry[1]
+        try:
+            addresses = _system_getaddrinfo(*args, **kwargs)
+        except socket.gaierror as e:
+            remember(key, (now + negative_ttl, None, e.args))
+            raise
+        remember(key, (now + ttl, addresses, None))
+        return addresses
+
+    def use_in_this_thread():
+        _dns_local.lookup = cached_getaddrinfo
+
+    # Overlapping crawls share one wrapper and the last one out takes it
+    # down. If something else has wrapped getaddrinfo on top of it since, it
+    # stays in place, passing every lookup through, rather than break theirs
+    with _dns_lock:
+        if not _dns_wrapped:
+            _system_getaddrinfo = socket.getaddrinfo
+            socket.getaddrinfo = _thread_getaddrinfo
+            _dns_wrapped = True
+        _dns_users += 1
     try:
-        result = urlparse(url)
-        return all([result.scheme, result.netloc])
-    except Exception:
-        return False
+        yield use_in_this_thread
+    finally:
+        with _dns_lock:
+            _dns_users -= 1
+            if _dns_users == 0 and socket.getaddrinfo is _thread_getaddrinfo:
+                socket.getaddrinfo = _system_getaddrinfo
+                _dns_wrapped = False
+
+
+def _create_session(max_workers):
+    """Create a session whose connection pools can serve every worker at once.
+
+    requests keeps 10 connections per host by default; with more workers the
+    extra connections are thrown away after each request instead of reused.
+    Dropped connections and read errors are retried twice with a short
+    backoff, so a blip doesn't get reported as a failed URL; responses are
+    never retried, whatever their status.
+    """
+    session = requests.Session()
+    session.headers.update({"User-Agent": "curl/8.7.1", "Accept": "*/*"})
+    adapter = HTTPAdapter(
+        pool_maxsize=max(max_workers, DEFAULT_POOLSIZE),
+        # urllib3 would otherwise retry 413/429/503 responses that carry a
+        # Retry-After header, sleeping for as long as the header says
+        max_retries=Retry(total=2, backoff_factor=0.2, respect_retry_after_header=False),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
 
 
-def process_url(url_info):
-    """Process a single URL and return its data."""
-    url, base_domain, should_recurse, referrer, depth = url_info
-    result = {"url": url, "links": [], "referrer": referrer}
-    logger = logging.getLogger("crawler")
+def _read_body(response, max_size=None):
+    """Read a streamed response body, giving up once it grows past max_size bytes.
+
+    Chunks are appended to a single BytesIO buffer, whose getvalue() hands
+    the buffer back without copying it, so peak memory stays at about one
+    body instead of the chunk list plus the joined copy.
+
+    Returns:
+        tuple: (body, truncated), where truncated tells whether the read
+            stopped before the end of the body
+    """
+    body = io.BytesIO()
+    for chunk in response.iter_content(chunk_size=65536):
+        body.write(chunk)
+        if max_size and body.tell() > max_size:
+            return body.getvalue(), True
+    return body.getvalue(), False
+
+
+def _content_length(response):
+    """Return the decoded body size a response declares, or None if it doesn't tell.
+
+    With a Content-Encoding, Content-Length counts the compressed bytes, not
+    the body iter_content() yields, so it is only trusted without one.
+    """
+    if response.headers.get("Content-Encoding", "identity").lower() != "identity":
+        return None
+    try:
+        return int(response.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+
+
+def _body_size(response, max_size=None):
+    """Get the size of a streamed response without keeping its body.
+
+    Uses Content-Length when it can be trusted, otherwise counts the decoded
+    bytes (up to just past max_size).
 
+    Returns:
+        tuple: (size, truncated), where truncated tells whether counting
+            stopped before the end of the body
+    """
+    content_length = _content_length(response)
+    if content_length is not None:
+        return content_length, False
+    total = 0
+    for chunk in response.iter_content(chunk_size=65536):
+        total += len(chunk)
+        if max_size and total > max_size:
+            return total, True
+    return total, False
+
+
+def _resolve_link(raw_link, page_url, origin):
+    """Resolve an href against the page it was found on, without its fragment.
+
+    Gives the same URL as joining the href with urljoin, dropping the
+    fragment and removing dot segments from the path, in as few steps as
+    possible: absolute or root-relative links without dot segments skip
+    urljoin altogether.
+
+    Args:
+        raw_link (str): The href as written in the page
+        page_url (str): URL of the page, after redirects
+        origin (str): "scheme://netloc" of page_url
+    """
+    link = raw_link.partition("#")[0].strip()
+    if "/." not in link:
+        if link.startswith(_HTTP_PREFIXES):
+            return link
+        if link.startswith("/") and not link.startswith("//"):
+            return origin + link
+        # page_url keeps the fragment of a redirect, and urljoin returns it
+        # as is for an empty href
+        return urljoin(page_url, link).partition("#")[0]
+    # urljoin only removes dot segments from relative paths, so join the
+    # resulting path onto the URL once more to remove them from links that
+    # name their host too
+    joined = urljoin(page_url, link).partition("#")[0]
+    _, _, path, query = _split_url(joined)
+    return urljoin(joined, path + ("?" + query if query else ""))
+
+
+def extract_links(page_content, final_url, encoding=None):
+    """Extract the unique, normalized absolute URLs linked from an HTML page.
+
+    Args:
+        page_content (bytes): The HTML body
+        final_url (str): URL the page was served from, after redirects
+        encoding (str, optional): Charset the server declared for the page;
+            lets BeautifulSoup skip detecting it
+
+    Returns:
+        list: Normalized link URLs, in document order
+
+    """
+    soup = BeautifulSoup(
+        page_content, "lxml", parse_only=_LINK_TAGS, from_encoding=encoding,
+    )
+    final_scheme, final_netloc, _, _ = _split_url(final_url)
+    origin = f"{final_scheme}://{final_netloc}"
+    # Nav bars and footers repeat links: resolve each distinct href once, then
+    # drop hrefs that resolve to the same URL. dicts keep document order.
+    hrefs = dict.fromkeys(link_tag["href"] for link_tag in soup.find_all("a", href=True))
+    return list(dict.fromkeys(_resolve_link(href, final_url, origin) for href in hrefs))
+
+
+def process_url(
+    url_info, base_domain, session, max_size=None, max_depth=None, parse_pool=None,
+):
+    """Process a single URL and return its data.
+
+    Args:
+        url_info (WorkItem): The URL to check and where it was found
+        base_domain (tuple): (scheme, netloc) of the site being crawled
+        session (requests.Session): Session shared by all workers of the crawl
+        max_size (int, optional): Stop downloading a page once it exceeds this
+            many bytes; links of such pages are not followed
+        max_depth (int, optional): Pages at this depth are not parsed, since
+            their links would be too deep to crawl
+        parse_pool (ProcessPoolExecutor, optional): Pool to extract links in;
+            by default pages are parsed in the calling thread
+    """
+    url, should_recurse, referrer, depth = url_info
+    result = {"url": url, "links": [], "referrer": referrer}
     if not is_valid_url(url):
-        logger.debug(f"Skipping invalid URL: {url}")
+        _logger.debug("Skipping invalid URL: %s", url)
         return url, {
             "status_code": "invalid",
             "size": 0,
@@ -115,132 +408,236 @@ def process_url(url_info):
         }
 
     try:
-        headers = {"User-Agent": "curl/8.7.1", "Accept": "*/*"}
-        response = requests.get(url, timeout=10, allow_redirects=True, headers=headers)
-        status_code = response.status_code
-
-        if 400 <= status_code < 600:
-            logger.error(f"Found error status code {status_code}: {url}")
-            return url, {
-                "status_code": status_code,
-                "size": 0,
-                "links": [],
-                "referrer": None,
-            }
-        if status_code == "error":
-            logger.info(f"Found status code {status_code}: {url}")
-            return url, {"status_code": 0, "size": 0, "links": [], "referrer": None}
-
-        page_content = response.content
-        size_in_bytes = len(page_content)
+        request_kwargs = {"timeout": 10, "allow_redirects": True}
+        if should_recurse:
+            response = session.get(url, stream=True, **request_kwargs)
+        else:
+            # External links are only checked, never parsed, so skip the body
+            response = session.head(url, **request_kwargs)
+            if response.status_code in _HEAD_REJECTED:
+                # Some servers refuse HEAD; fall back to a GET but leave the body unread
+                response.close()
+                response = session.get(url, stream=True, **request_kwargs)
+
+        with response:
+            status_code = response.status_code
+
+            if 400 <= status_code < 600:
+                _logger.error("Found error status code %s: %s", status_code, url)
+                return url, {
+                    "status_code": status_code,
+                    "size": 0,
+                    "links": [],
+                    "referrer": referrer,
+                }
+            if status_code == "error":
+                _logger.info("Found status code %s: %s", status_code, url)
+                return url, {"status_code": 0, "size": 0, "links": [], "referrer": referrer}
+
+            # Only HTML pages are parsed; for anything else we just need the size.
+            # The media type leads the header, so only its first 9 chars matter
+            content_type = response.headers.get("Content-Type", "")
+            is_html = content_type[:9].lower() == "text/html"
+            # A page that declares more than max_size is measured from its
+            # header alone; its links wouldn't be followed anyway
+            content_length = _content_length(response)
+            too_big = max_size and content_length is not None and content_length > max_size
+            truncated = False
+            if not should_recurse:
+                # Only the status matters for links we don't crawl
+                page_content = b""
+                size_in_bytes = content_length or 0
+                encoding = None
+            elif is_html and not too_big:
+                page_content, truncated = _read_body(response, max_size)
+                size_in_bytes = len(page_content)
+                charset_match = _CHARSET_RE.search(content_type)
+                encoding = charset_match.group(1) if charset_match else None
+            else:
+                page_content = b""
+                size_in_bytes, truncated = _body_size(response, max_size)
+                encoding = None
 
         # Check if the final URL after redirects is still in our domain
         final_url = response.url
         if not is_same_domain(final_url, base_domain):
-            logger.debug(f"URL {url} redirected outside our domain to {final_url}")
+            _logger.debug("URL %s redirected outside our domain to %s", url, final_url)
             return url, {
                 "status_code": status_code,
                 "size": size_in_bytes,
+                "truncated": truncated,
                 "links": [],
                 "referrer": referrer,
             }
 
-        result.update({"status_code": status_code, "size": size_in_bytes})
+        result.update({"status_code": status_code, "size": size_in_bytes, "truncated": truncated})
+
+        # Don't parse pages whose links would all be discarded
+        if max_depth is not None and depth >= max_depth:
+            page_content = b""
+        elif max_size and size_in_bytes > max_size:
+            _logger.debug("Not following links of %s: exceeds maximum size", url)
+            page_content = b""
 
-        # Only proceed if it's HTML
-        content_type = response.headers.get("Content-Type", "")
-        if "text/html" in content_type.lower():
-            soup = BeautifulSoup(page_content, "html.parser")
-            for link_tag in soup.find_all("a", href=True):
-                raw_link = link_tag.get("href")
-                # Use final_url instead of original url
-                next_link = urljoin(final_url, raw_link)
-                normalized_link = normalize_url(next_link)
+        if page_content:
+            if parse_pool is None:
+                links = extract_links(page_content, final_url, encoding)
+            else:
+                links = parse_pool.submit(
+                    extract_links, page_content, final_url, encoding,
+                ).result()
 
+            for normalized_link in links:
                 # For internal links - continue crawling with no depth limit
                 if is_same_domain(normalized_link, base_domain):
                     # Keep recursing for internal links if within depth limit
-                    result["links"].append((normalized_link, True, url, depth + 1))
+                    result["links"].append(WorkItem(normalized_link, True, url, depth + 1))
                 # For external links - only check them once (no recursion)
                 elif should_recurse:  # Only add external links from internal pages
                     # External links never recurse
-                    result["links"].append((normalized_link, False, url, depth + 1))
+                    result["links"].append(WorkItem(normalized_link, False, url, depth + 1))
 
-            logger.debug(f"Found {len(result['links'])} new links from {url}")
+            _logger.debug("Found %d new links from %s", len(result["links"]), url)
 
     except requests.RequestException:
-        logger.exception(f"Error fetching {url}")
-        return url, {"status_code": "error", "size": 0, "links": [], "referrer": None}
+        _logger.exception("Error fetching %s", url)
+        return url, {"status_code": "error", "size": 0, "links": [], "referrer": referrer}
 
     return url, result
 
 
-def crawl_site(start_url, max_workers=10, max_depth=None):
+def _safe_process_url(url_info, **kwargs):
+    """Run process_url, turning any unexpected failure into an error result.
+
+    Every work item then yields exactly one (url, data) pair, so the crawl
+    loop never has to map a failed future back to the URL it was for.
+    """
+    try:
+        return process_url(url_info, **kwargs)
+    except BaseException as e:
+        _logger.exception("Error processing %s: %s", url_info.url, e)
+        return url_info.url, {
+            "status_code": "error",
+            "size": 0,
+            "links": [],
+            "referrer": url_info.referrer,
+        }
+
+
+def _parse_pool_context():
+    """Pick the multiprocessing context for the parse pool.
+
+    Plain fork is unsafe once the fetching threads are running. Use a fork
+    server preloaded with this module where the platform has one, so parse
+    workers start with BeautifulSoup and lxml already imported; spawn
+    elsewhere.
+    """
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def crawl_site(start_url, max_workers=10, max_depth=None, max_size=None, parse_workers=0):
     """Crawl a website starting from start_url and check for broken links.
 
     Args:
         start_url (str): The URL to start crawling from
         max_workers (int): Number of parallel workers
         max_depth (int, optional): Maximum depth to crawl
+        max_size (int, optional): Maximum page size of interest; bodies are
+            not downloaded past it
+        parse_workers (int): Number of processes to parse HTML in; 0 parses
+            in the fetching threads
 
-    Returns:
-        dict: Results containing status codes and sizes for all URLs
+    Yields:
+        tuple: (url, data) for each URL as soon as it has been checked, where
+            data holds its status code, size and referrer; "truncated" is set
+            when the body was cut off at max_size, making size a lower bound
 
     """
-    logger = logging.getLogger("crawler")
-    logger.debug(f"Starting crawl from {start_url}")
-    if not start_url.startswith(("http://", "https://")):
+    _logger.debug("Starting crawl from %s", start_url)
+    if not start_url.startswith(_HTTP_PREFIXES):
         start_url = "http://" + start_url
 
     base_domain = get_domain(start_url)
-    logger.debug(f"Base domain: {base_domain[0]}://{base_domain[1]}")
+    _logger.debug("Base domain: %s://%s", *base_domain)
 
-    # Track URLs to process and those we've seen, along with their original referrers
+    # Referrers travel with each work item, so this only keeps the smallest
+    # depth each URL has been queued at
     normalized_start = normalize_url(start_url)
-    to_process = [(normalized_start, base_domain, True, None, 0)]
-    seen_urls = {normalized_start: None}  # Track referrers in seen_urls
-    results = {}
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        while to_process:
-            future_to_url = {
-                executor.submit(process_url, url_info): url_info[0]
-                for url_info in to_process
-            }
-
-            to_process = []
-
-            for future in as_completed(future_to_url):
-                url = future_to_url[future]
-                try:
-                    url, data = future.result()
-                    data["referrer"] = seen_urls[url]
-                    results[url] = data
-
-                    for new_url, new_should_recurse, _, new_depth in data.get(
-                        "links", [],
-                    ):
-                        if new_url not in seen_urls and (
-                            max_depth is None or new_depth <= max_depth
-                        ):
-                            seen_urls[new_url] = url
-                            to_process.append(
-                                (
-                                    new_url,
-                                    base_domain,
-                                    new_should_recurse,
-                                    url,
-                                    new_depth,
-                                ),
-                            )
-
-                except Exception as e:
-                    logger.exception(f"Error processing {url}: {e}")
-                    results[url] = {
-                        "status_code": "error",
-                        "size": 0,
-                        "referrer": seen_urls.get(url),
-                    }
-
-    logger.debug(f"Crawl complete. Visited {len(results)} URLs")
-    return results
+    seen_depths = {normalized_start: 0}
+    # URLs queued again through a shorter path, with how many of their
+    # results are still to come; each URL is only reported once
+    requeued = {}
+    visited = 0
+
+    with ExitStack() as stack:
+        use_dns_cache = stack.enter_context(_dns_cache())
+        # A single session lets every worker reuse keep-alive TCP/TLS connections
+        # instead of opening a new one for each request
+        session = stack.enter_context(_create_session(max_workers))
+        parse_pool = None
+        if parse_workers:
+            # Parsing in other processes gets around the GIL, at the cost of
+            # sending every page body across
+            parse_pool = stack.enter_context(ProcessPoolExecutor(
+                max_workers=parse_workers,
+                mp_context=_parse_pool_context(),
+            ))
+        executor = stack.enter_context(ThreadPoolExecutor(
+            max_workers=max_workers,
+            initializer=use_dns_cache,
+        ))
+        check_url = partial(
+            _safe_process_url,
+            base_domain=base_domain,
+            session=session,
+            max_size=max_size,
+            max_depth=max_depth,
+            parse_pool=parse_pool,
+        )
+
+        # Workers hand their results straight to a queue as they finish, and
+        # new links are submitted as soon as the page that found them comes
+        # out of it, so a single slow URL never leaves the rest of the pool idle
+        results = queue.Queue()
+
+        def submit(url_info):
+            future = executor.submit(check_url, url_info)
+            future.add_done_callback(lambda f: results.put(f.result()))
+
+        submit(WorkItem(normalized_start, True, None, 0))
+        in_flight = 1
+
+        while in_flight:
+            url, data = results.get()
+            in_flight -= 1
+
+            for link in data["links"]:
+                if max_depth is not None and link.depth > max_depth:
+                    continue
+                seen_depth = seen_depths.get(link.url)
+                if seen_depth is not None:
+                    # Results don't arrive level by level, so a page can first
+                    # be queued through a longer path. With a depth limit that
+                    # can leave links it has uncrawled; check it again from
+                    # the shorter path so the crawl matches a breadth-first one
+                    if max_depth is None or not link.should_recurse or link.depth >= seen_depth:
+                        continue
+                    requeued[link.url] = requeued.get(link.url, 0) + 1
+                seen_depths[link.url] = link.depth
+                submit(link)
+                in_flight += 1
+
+            if url in requeued:
+                requeued[url] -= 1
+                if not requeued[url]:
+                    del requeued[url]
+                continue
+
+            visited += 1
+            yield url, data
+
+    _logger.debug("Crawl complete. Visited %d URLs", visited)